@@ -1,9 +1,310 @@
+import hashlib
+import json
+import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+from xml.sax.saxutils import escape
+
 import requests
 import viktor as vkt
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library JSON codec
+    orjson = None
 
 # AEC Data Model GraphQL endpoint
 AEC_GRAPHQL_URL = "https://developer.api.autodesk.com/aec/graphql"
 
+# Master list of categories checked against the contract scope
+ALL_CATEGORIES = (
+    "Structural Framing",
+    "Structural Columns",
+    "Structural Foundations",
+    "Walls",
+    "Floors",
+    "Roofs",
+    "Ceilings",
+    "Doors",
+    "Windows",
+    "Stairs",
+    "Railings",
+    "Curtain Panels",
+    "Curtain Wall Mullions",
+    "Furniture",
+    "Mechanical Equipment",
+    "Plumbing Fixtures",
+    "Lighting Fixtures",
+    "Electrical Equipment",
+    "Ducts",
+    "Pipes",
+)
+ALL_CATEGORY_SET = frozenset(ALL_CATEGORIES)
+CATEGORY_ORDER = {name: index for index, name in enumerate(ALL_CATEGORIES)}
+
+# Query to get the distinct categories of the filtered elements with their counts
+USED_CATEGORIES_QUERY = """
+query UsedCategories($elementGroupId: ID!, $filter: String!, $limit: Int!) {
+  distinctPropertyValuesInElementGroupByName(
+    elementGroupId: $elementGroupId
+    name: "Category"
+    filter: { query: $filter }
+  ) {
+    results {
+      values(limit: $limit) {
+        value
+        count
+      }
+    }
+  }
+}
+"""
+
+# Status bucket of a category, a 2-bit index of (in contract << 1) | in model
+STATUS_PRESENT = 0b11
+STATUS_MISSING_FROM_MODEL = 0b10
+STATUS_MISSING_FROM_CONTRACT = 0b01
+STATUS_NOT_APPLICABLE = 0b00
+
+
+class StatusStyle(NamedTuple):
+    """Presentation of a status bucket in the summary table, report and data view."""
+
+    symbol: str
+    text: str
+    rgb: tuple
+    data_status: vkt.DataStatus
+    data_message: str
+
+
+# Presentation of each status bucket
+STATUS_TABLE = {
+    STATUS_PRESENT: StatusStyle(
+        "✓",
+        "Present in contract and model(s)",
+        (0, 128, 0),  # Green
+        vkt.DataStatus.SUCCESS,
+        "✓ Present in contract and model",
+    ),
+    STATUS_MISSING_FROM_MODEL: StatusStyle(
+        "✗",
+        "In contract but not in model(s)",
+        (255, 165, 0),  # Orange
+        vkt.DataStatus.ERROR,
+        "✗ In contract but not in model",
+    ),
+    STATUS_MISSING_FROM_CONTRACT: StatusStyle(
+        "✗",
+        "Missing in the contract",
+        (255, 0, 0),  # Red
+        vkt.DataStatus.WARNING,
+        "✗ Missing in the contract",
+    ),
+    STATUS_NOT_APPLICABLE: StatusStyle(
+        "✗",
+        "Not in contract, not in model(s)",
+        (128, 128, 128),  # Gray
+        vkt.DataStatus.INFO,
+        "Not in contract, not in model",
+    ),
+}
+
+# Status colors of each bucket, built once for the summary table and the report
+TABLE_COLOR_BY_BUCKET = {
+    bucket: vkt.Color(*style.rgb) for bucket, style in STATUS_TABLE.items()
+}
+DOCX_COLOR_BY_BUCKET = {
+    bucket: "{:02X}{:02X}{:02X}".format(*style.rgb)
+    for bucket, style in STATUS_TABLE.items()
+}
+
+# GraphQL error codes of a query that was rejected before it ran, e.g. because
+# the schema does not support it. Other errors are about the data of a file.
+GRAPHQL_VALIDATION_CODES = frozenset(
+    {"GRAPHQL_PARSE_FAILED", "GRAPHQL_VALIDATION_FAILED"}
+)
+
+# RSQL condition appended to category filters to select instances only
+RSQL_INSTANCE_FILTER = "'property.name.Element Context'==Instance"
+RSQL_INSTANCE_SUFFIX = " and " + RSQL_INSTANCE_FILTER
+
+# Aliased count-only aggregation of one category, formatted once per alias
+CATEGORY_COUNT_FIELD = """
+  {alias}: distinctPropertyValuesInElementGroupByName(
+    elementGroupId: $elementGroupId
+    name: "Category"
+    filter: {{ query: ${alias}Filter }}
+  ) {{
+    results {{
+      values(limit: 1) {{
+        count
+      }}
+    }}
+  }}"""
+
+# Aliased selection of one category's elements, formatted once per alias
+CATEGORY_ELEMENTS_FIELD = """
+  {alias}: elementsByElementGroup(
+    elementGroupId: $elementGroupId,
+    filter: {{ query: ${alias}Filter }},
+    pagination: ${alias}Pagination
+  ) {{
+    pagination {{ cursor pageSize }}
+    results {{
+      alternativeIdentifiers {{
+        externalElementId
+      }}
+    }}
+  }}"""
+
+
+def _create_session() -> requests.Session:
+    """
+    Create a requests session with a keep-alive connection pool for the AEC API.
+
+    All GraphQL queries are read-only, so POST requests are safe to retry on
+    transient server errors. Responses are requested compressed with every
+    encoding urllib3 can decode, which includes Brotli when it is installed.
+
+    Returns:
+        Configured requests Session
+    """
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    retries = Retry(
+        total=3,
+        backoff_factor=0.1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["POST"],
+        raise_on_status=False,
+    )
+    session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries),
+    )
+    return session
+
+
+# Shared session so consecutive queries reuse the same HTTPS connection
+_SESSION = _create_session()
+
+
+class _TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after a fixed time."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Args:
+            maxsize: Maximum number of entries, least recently used are evicted first
+            ttl: Lifetime of an entry in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the live value stored under key, or the default."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if time.monotonic() - entry[0] >= self.ttl:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Responses of queries on a specific model version, which never change
+_VERSIONED_CACHE = _TTLCache(maxsize=64, ttl=24 * 3600)
+
+# Region, element group ID and latest version URN per Autodesk file and user
+_FILE_METADATA_CACHE = _TTLCache(maxsize=32, ttl=300)
+
+# Count query strategies that failed validation, keyed on (strategy, category
+# count, element group ID, user), so later fetches of the same file go straight
+# to the fallback instead of repeating the rejection
+_REJECTED_QUERIES = _TTLCache(maxsize=32, ttl=3600)
+
+# Minimum number of seconds between progress messages, tracked per thread
+PROGRESS_INTERVAL = 0.1
+_PROGRESS_STATE = threading.local()
+
+
+def _token_hash(token: str) -> str:
+    """Return a short hash of an access token, for cache keys that must not hold it."""
+    return hashlib.sha1(token.encode()).hexdigest()[:16]
+
+
+def _report_progress(message: str, percentage: float) -> None:
+    """
+    Show a progress message, unless the previous one was shown very recently.
+
+    Fast views finish before the UI can render every update, so messages issued
+    within PROGRESS_INTERVAL of the previous one in the same thread are skipped.
+
+    Args:
+        message: Progress message to show
+        percentage: Progress percentage (0-100)
+    """
+    now = time.monotonic()
+    if now - getattr(_PROGRESS_STATE, "last", float("-inf")) < PROGRESS_INTERVAL:
+        return
+    _PROGRESS_STATE.last = now
+    vkt.progress_message(message, percentage=percentage)
+
+
+def _get_autodesk_token() -> str:
+    """
+    Get an access token of the current user from the Autodesk OAuth2 integration.
+
+    The token is not cached at module level: the app process serves several
+    users, and the integration already handles refreshing the token.
+
+    Returns:
+        OAuth2 access token
+    """
+    integration = vkt.external.OAuth2Integration("autodesk-integration")
+    return integration.get_access_token()
+
+
+class GraphQLError(RuntimeError):
+    """Raised when the AEC Data Model API answers a query with GraphQL errors."""
+
+    def __init__(self, errors: list, data: dict = None):
+        """
+        Args:
+            errors: Error entries of the response
+            data: Partial response data returned next to the errors, if any
+        """
+        super().__init__(f"GraphQL errors: {errors}")
+        self.errors = errors
+        self.data = data
+
+    @property
+    def is_validation_error(self) -> bool:
+        """Whether the query itself was rejected, rather than failing on the data."""
+        return any(
+            _get_nested(error, "extensions", "code") in GRAPHQL_VALIDATION_CODES
+            for error in self.errors
+        )
+
 
 def execute_graphql(
     query: str, token: str, region: str, variables: dict = None, timeout: int = 30
@@ -20,6 +321,10 @@ def execute_graphql(
 
     Returns:
         Dictionary containing the response data
+
+    Raises:
+        GraphQLError: If the query was rejected, e.g. by schema validation
+        RuntimeError: If the HTTP request failed
     """
     headers = {
         "Authorization": f"Bearer {token}",
@@ -27,18 +332,986 @@ def execute_graphql(
         "Region": region,
     }
     payload = {"query": query, "variables": variables or {}}
-    resp = requests.post(
-        AEC_GRAPHQL_URL, headers=headers, json=payload, timeout=timeout
-    )
+    if orjson is not None:
+        resp = _SESSION.post(
+            AEC_GRAPHQL_URL,
+            headers=headers,
+            data=orjson.dumps(payload),
+            timeout=timeout,
+        )
+    else:
+        resp = _SESSION.post(
+            AEC_GRAPHQL_URL, headers=headers, json=payload, timeout=timeout
+        )
 
     if resp.status_code != 200:
         raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
 
-    body = resp.json()
+    body = orjson.loads(resp.content) if orjson is not None else resp.json()
     if body.get("errors"):
-        raise RuntimeError(f"GraphQL errors: {body['errors']}")
+        raise GraphQLError(body["errors"], body.get("data"))
+
+    return body.get("data", {})
+
+
+def _execute_versioned(
+    version_urn: str, query: str, token: str, region: str, variables: dict = None
+):
+    """
+    Execute a GraphQL query whose response only depends on the model version.
+
+    Responses are cached in-process on the version URN and the bound query, so
+    later jobs on the same model version skip Autodesk entirely. The URN can only
+    be obtained with access to the file, so entries are shared between users.
+
+    Args:
+        version_urn: URN of the model version the query reads
+        query: GraphQL query string
+        token: OAuth2 access token
+        region: Region identifier (e.g., 'US', 'EMEA')
+        variables: Optional dictionary of GraphQL variables
+
+    Returns:
+        Dictionary containing the response data. The dictionary may be shared
+        with other callers, so it must not be mutated.
+    """
+    bound_query = f"{version_urn}|{query}|{json.dumps(variables or {}, sort_keys=True)}"
+    key = hashlib.blake2b(bound_query.encode(), digest_size=16).hexdigest()
+
+    data = _VERSIONED_CACHE.get(key)
+    if data is None:
+        data = execute_graphql(query, token, region, variables)
+        _VERSIONED_CACHE.set(key, data)
+    return data
+
+
+def _get_nested(data, *keys, default=None):
+    """
+    Walk a path of keys through nested GraphQL response dictionaries.
+
+    Args:
+        data: Response dictionary to start from
+        *keys: Keys to follow, outermost first
+        default: Value returned when a key is missing, null or not a dictionary
+
+    Returns:
+        Value found at the end of the path, or the default
+    """
+    for key in keys:
+        if not isinstance(data, dict):
+            return default
+        data = data.get(key)
+        if data is None:
+            return default
+    return data
+
+
+@lru_cache(maxsize=8)
+def _build_category_counts_query(alias_count: int) -> str:
+    """
+    Build a count-only GraphQL document with aliases c0 to c<alias_count - 1>.
+
+    Every alias gets its own filter variable, named ``<alias>Filter``, so the
+    document only depends on the number of categories and is built once per
+    size.
+
+    Args:
+        alias_count: Number of categories to count
+
+    Returns:
+        GraphQL query string
+    """
+    aliases = [f"c{index}" for index in range(alias_count)]
+    definitions = "".join(f", ${alias}Filter: String!" for alias in aliases)
+    fields = "".join(CATEGORY_COUNT_FIELD.format(alias=alias) for alias in aliases)
+    return f"query CategoryCounts($elementGroupId: ID!{definitions}) {{{fields}\n}}"
+
+
+def _extra_categories(category_names) -> tuple:
+    """
+    Get the categories that are not part of the master list, e.g. loaded from a CSV.
+
+    Args:
+        category_names: Category names, empty entries are ignored
+
+    Returns:
+        Sorted tuple of the category names outside ALL_CATEGORIES
+    """
+    return tuple(sorted({name for name in category_names if name} - ALL_CATEGORY_SET))
+
+
+def _category_instance_filter(category_name: str) -> str:
+    """
+    Build an RSQL filter selecting the instances of a single category.
+
+    Quotes and backslashes in the name are escaped, so category names loaded from
+    a CSV cannot break out of the quoted RSQL value.
+
+    Args:
+        category_name: Revit category name (e.g., 'Walls')
+
+    Returns:
+        RSQL filter string
+    """
+    quoted_name = category_name.replace("\\", "\\\\").replace("'", "\\'")
+    return f"property.name.category=='{quoted_name}'" + RSQL_INSTANCE_SUFFIX
+
+
+def _categories_instance_filter(category_names) -> str:
+    """
+    Build an RSQL filter selecting the instances of any of the given categories.
+
+    Args:
+        category_names: Revit category names (e.g., ['Walls', 'Floors'])
+
+    Returns:
+        RSQL filter string
+    """
+    return " or ".join(
+        f"({_category_instance_filter(name)})" for name in category_names
+    )
+
+
+def _fetch_model_category_counts(
+    token: str,
+    region: str,
+    group_id: str,
+    version_urn: str,
+    extra_categories: tuple = (),
+) -> dict:
+    """
+    Fetch the element count per category of all instances in a model.
+
+    Only the counts of the known categories and the given extra categories are
+    requested. The response is cached per model version, so views rendering the
+    same model share a single request.
+
+    Args:
+        token: OAuth2 access token
+        region: Region identifier (e.g., 'US', 'EMEA')
+        group_id: AEC Data Model element group ID of the model
+        version_urn: URN of the latest version of the model
+        extra_categories: Categories outside ALL_CATEGORIES to count as well
+
+    Returns:
+        Dictionary mapping category names to element counts
+    """
+    # One aliased count per category, alias c<i> maps to category_names[i]
+    category_names = ALL_CATEGORIES + tuple(extra_categories)
+    variables = {"elementGroupId": group_id}
+    for index, name in enumerate(category_names):
+        variables[f"c{index}Filter"] = _category_instance_filter(name)
+
+    rejected_key = (
+        "category_counts",
+        len(category_names),
+        group_id,
+        _token_hash(token),
+    )
+    if not _REJECTED_QUERIES.get(rejected_key, False):
+        try:
+            data = _execute_versioned(
+                version_urn,
+                _build_category_counts_query(len(category_names)),
+                token,
+                region,
+                variables,
+            )
+        except GraphQLError as e:
+            # Only fall back if the query shape is rejected, errors about the
+            # file and HTTP failures are raised as is
+            if not e.is_validation_error:
+                raise
+            _REJECTED_QUERIES.set(rejected_key, True)
+        else:
+            try:
+                return {
+                    category_name: v["count"]
+                    for index, category_name in enumerate(category_names)
+                    for r in data[f"c{index}"]["results"]
+                    for v in r["values"]
+                    if v["count"]
+                }
+            except (KeyError, TypeError) as e:
+                raise vkt.UserError(f"Unexpected category counts response: {str(e)}")
+
+    # Fall back to the distinct values query
+    return _fetch_distinct_category_counts(
+        token, region, group_id, version_urn, extra_categories
+    )
+
+
+def _fetch_distinct_category_counts(
+    token: str,
+    region: str,
+    group_id: str,
+    version_urn: str,
+    extra_categories: tuple = (),
+) -> dict:
+    """
+    Fetch the element count per category from the distinct category values.
+
+    Args:
+        token: OAuth2 access token
+        region: Region identifier (e.g., 'US', 'EMEA')
+        group_id: AEC Data Model element group ID of the model
+        version_urn: URN of the latest version of the model
+        extra_categories: Categories outside ALL_CATEGORIES to count as well
+
+    Returns:
+        Dictionary mapping category names to element counts
+    """
+    # Restrict the aggregation to the categories that are checked, so the
+    # server does not aggregate every category of the model
+    category_names = ALL_CATEGORIES + tuple(extra_categories)
+    variables = {
+        "elementGroupId": group_id,
+        "filter": _categories_instance_filter(category_names),
+        "limit": len(category_names) + 8,  # Small buffer over the checked categories
+    }
+    rejected_key = (
+        "category_values",
+        len(category_names),
+        group_id,
+        _token_hash(token),
+    )
+    data = None
+    if not _REJECTED_QUERIES.get(rejected_key, False):
+        try:
+            data = _execute_versioned(
+                version_urn, USED_CATEGORIES_QUERY, token, region, variables
+            )
+        except GraphQLError as e:
+            # Only fall back if the scoped filter is rejected, errors about the
+            # file and HTTP failures are raised as is
+            if not e.is_validation_error:
+                raise
+            _REJECTED_QUERIES.set(rejected_key, True)
+
+    if data is None:
+        # Fall back to aggregating all instances
+        variables = {
+            "elementGroupId": group_id,
+            "filter": RSQL_INSTANCE_FILTER,
+            "limit": 1000,  # High limit to get all categories
+        }
+        data = _execute_versioned(
+            version_urn, USED_CATEGORIES_QUERY, token, region, variables
+        )
+    try:
+        results_list = data["distinctPropertyValuesInElementGroupByName"]["results"]
+        return {
+            v["value"]: v["count"]
+            for r in results_list
+            for v in r["values"]
+            if v.get("value")
+        }
+    except (KeyError, TypeError) as e:
+        raise vkt.UserError(f"Unexpected category values response: {str(e)}")
+
+
+def _get_file_metadata(autodesk_file, token: str) -> tuple:
+    """
+    Get the region, AEC Data Model element group ID and latest version URN of a file.
+
+    All lookups are network calls, so they run concurrently and the result is
+    cached for a few minutes per file and user to serve views that are opened
+    one after the other.
+
+    Args:
+        autodesk_file: AutodeskFile selected in the parametrization
+        token: OAuth2 access token
+
+    Returns:
+        Tuple of (region, element group ID, latest version URN)
+    """
+    key = (autodesk_file.url, _token_hash(token))
+    metadata = _FILE_METADATA_CACHE.get(key)
+    if metadata is None:
+        # The lookups are independent round-trips, so they are made concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = (
+                executor.submit(autodesk_file.get_region, token),
+                executor.submit(
+                    autodesk_file.get_aec_data_model_element_group_id, token
+                ),
+                executor.submit(autodesk_file.get_latest_version, token),
+            )
+        try:
+            region, group_id, latest_version = (f.result() for f in futures)
+        except Exception as e:
+            raise vkt.UserError(f"Failed to read Autodesk file metadata: {str(e)}")
+        metadata = (region, group_id, latest_version.urn)
+        _FILE_METADATA_CACHE.set(key, metadata)
+    return metadata
+
+
+def _fetch_file_category_counts(autodesk_file, token: str) -> dict:
+    """
+    Fetch the element count per category of all instances in an Autodesk file.
+
+    Args:
+        autodesk_file: AutodeskFile selected in the parametrization
+        token: OAuth2 access token
+
+    Returns:
+        Dictionary mapping category names to element counts
+    """
+    region, group_id, version_urn = _get_file_metadata(autodesk_file, token)
+    return _fetch_model_category_counts(token, region, group_id, version_urn)
+
+
+def _fetch_files_category_counts(structural_file, electrical_file, token: str):
+    """
+    Fetch the category counts of the structural and electrical files concurrently.
+
+    The fetches only wait on the network, so running them on two threads makes
+    the total latency that of the slowest file rather than the sum of both. A file
+    that is not selected or fails to load is reported and yields empty counts.
+
+    Args:
+        structural_file: Selected structural AutodeskFile, or None
+        electrical_file: Selected electrical AutodeskFile, or None
+        token: OAuth2 access token
+
+    Returns:
+        Tuple of (structural counts, electrical counts) dictionaries
+    """
+    files = {"structural": structural_file, "electrical": electrical_file}
+    counts = {kind: {} for kind in files}
+
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        futures = {
+            kind: executor.submit(_fetch_file_category_counts, autodesk_file, token)
+            for kind, autodesk_file in files.items()
+            if autodesk_file
+        }
+
+    for kind, future in futures.items():
+        try:
+            counts[kind] = future.result()
+        except Exception as e:
+            vkt.UserMessage.warning(
+                f"Failed to fetch categories from {kind} file: {str(e)}"
+            )
+
+    return counts["structural"], counts["electrical"]
+
+
+def _classify_categories(required_categories, *category_counts) -> list:
+    """
+    Classify every category of ALL_CATEGORIES against the contract scope and models.
+
+    Args:
+        required_categories: Categories in the contract scope
+        *category_counts: Dictionaries of element counts, one per model
+
+    Returns:
+        List of (category name, total element count, status bucket) tuples in
+        ALL_CATEGORIES order
+    """
+    required_categories = frozenset(required_categories)
+    getters = [counts.get for counts in category_counts]
+
+    classification = []
+    for category_name in ALL_CATEGORIES:
+        element_count = sum(get(category_name, 0) for get in getters)
+        in_contract = category_name in required_categories
+        bucket = (in_contract << 1) | (element_count > 0)
+        classification.append((category_name, element_count, bucket))
+
+    return classification
+
+
+def _build_category_elements_query(aliases: list) -> str:
+    """
+    Build a GraphQL document with one aliased elementsByElementGroup field per alias.
+
+    Every alias gets its own filter and pagination variables, named
+    ``<alias>Filter`` and ``<alias>Pagination``, so each category can be paged
+    independently within the same request.
+
+    Args:
+        aliases: Field aliases to include in the document
+
+    Returns:
+        GraphQL query string
+    """
+    definitions = "".join(
+        f", ${alias}Filter: String!, ${alias}Pagination: PaginationInput"
+        for alias in aliases
+    )
+    fields = "".join(CATEGORY_ELEMENTS_FIELD.format(alias=alias) for alias in aliases)
+    return f"query CategoryElements($elementGroupId: ID!{definitions}) {{{fields}\n}}"
+
+
+def _iter_categories_external_ids(
+    category_names: list, group_id: str, token: str, region: str
+):
+    """
+    Yield the external IDs of all instances of several categories in batched requests.
+
+    All categories are queried in a single aliased GraphQL document per page.
+    Categories that run out of pages are dropped from the next document, so the
+    number of requests equals the page depth of the largest category. IDs are
+    yielded page by page as they arrive, so the full result set is never buffered.
+    A category whose field fails is reported and dropped, the other categories of
+    the same document are still yielded.
+
+    Args:
+        category_names: Revit category names (e.g., ['Walls', 'Floors'])
+        group_id: AEC Data Model element group ID of the model
+        token: OAuth2 access token
+        region: Region identifier (e.g., 'US', 'EMEA')
+
+    Yields:
+        Tuples of (category name, external element ID)
+    """
+    aliases = {f"c{i}": name for i, name in enumerate(category_names)}
+
+    # Construct the RSQL filter of every category once, they are reused on each page
+    filters = {
+        alias: _category_instance_filter(name) for alias, name in aliases.items()
+    }
+
+    # Pending aliases with the cursor of their next page (None for the first page)
+    cursors = {alias: None for alias in aliases}
+
+    # Page sizes to try, largest first, in case the server rejects a limit
+    limits = [500, 200, 100]
+
+    while cursors:
+        limit = limits[0]
+        query = _build_category_elements_query(list(cursors))
+        variables = {"elementGroupId": group_id}
+        for alias, cursor in cursors.items():
+            variables[f"{alias}Filter"] = filters[alias]
+            variables[f"{alias}Pagination"] = (
+                {"limit": limit} if not cursor else {"cursor": cursor, "limit": limit}
+            )
+
+        try:
+            data = execute_graphql(query, token, region, variables)
+        except GraphQLError as e:
+            # Retry the same page with a smaller page size if the limit was rejected,
+            # HTTP failures such as throttling are raised as is
+            if "limit" in str(e).lower() and len(limits) > 1:
+                limits.pop(0)
+                continue
+
+            # Keep the categories that returned data, a failing field is null
+            failed = {alias for alias in cursors if _get_nested(e.data, alias) is None}
+            if len(failed) == len(cursors):
+                raise
+            for alias in failed:
+                messages = [
+                    error.get("message", "")
+                    for error in e.errors
+                    if (_get_nested(error, "path") or [None])[0] == alias
+                ]
+                vkt.UserMessage.warning(
+                    f"Could not fetch elements of category '{aliases[alias]}': "
+                    f"{'; '.join(messages) or str(e)}"
+                )
+                del cursors[alias]
+            data = e.data
+
+        next_cursors = {}
+        for alias, cursor in cursors.items():
+            block = _get_nested(data, alias, default={})
+            page_results = _get_nested(block, "results", default=[])
+
+            for element in page_results:
+                # Get External ID from alternativeIdentifiers
+                external_id = _get_nested(
+                    element, "alternativeIdentifiers", "externalElementId"
+                )
+                if external_id:
+                    yield aliases[alias], external_id
+
+            # Check pagination
+            new_cursor = _get_nested(block, "pagination", "cursor")
+
+            # Stop on empty cursor, repeated cursor, or empty page
+            if not new_cursor or new_cursor == cursor or len(page_results) == 0:
+                continue
+
+            next_cursors[alias] = new_cursor
+
+        cursors = next_cursors
+
+
+# APS viewer page that isolates and colors the elements listed in $EXTERNAL_IDS
+VIEWER_HTML_TEMPLATE = string.Template(
+    """<!DOCTYPE html>
+    <html>
+    <head>
+    <meta charset="utf-8" />
+    <title>APS Viewer - Colored Categories</title>
+    <link rel="stylesheet" href="https://developer.api.autodesk.com/modelderivative/v2/viewers/7.*/style.min.css" type="text/css">
+    <script src="https://developer.api.autodesk.com/modelderivative/v2/viewers/7.*/viewer3D.min.js"></script>
+    <style>
+        html, body, #apsViewerDiv { width: 100%; height: 100%; margin: 0; }
+    </style>
+    </head>
+    <body>
+    <div id="apsViewerDiv"></div>
+
+    <script>
+    // Injected external IDs from backend
+    var EXTERNAL_IDS = $EXTERNAL_IDS;
+    // Replace these three in your backend
+    var ACCESS_TOKEN = '$APS_TOKEN';
+    var DOCUMENT_URN = 'urn:$URN';
+    
+    console.log('External IDs:', EXTERNAL_IDS);
+
+    // Disable analytics for sandbox iframes
+    try { Autodesk.Viewing.Private.analytics.optOut(); } catch (e) {}
+
+    let viewer = null;
+    let modelLoaded = null;
+
+    Autodesk.Viewing.Initializer(
+        { env: 'AutodeskProduction2', api: 'streamingV2', accessToken: ACCESS_TOKEN },
+        function () {
+        const container = document.getElementById('apsViewerDiv');
+        viewer = new Autodesk.Viewing.GuiViewer3D(container, { disableBimWalkInfoIcon: true });
+        viewer.start();
+        console.log('Viewer started');
+
+        if (!DOCUMENT_URN) {
+            console.error('Missing URN');
+            return;
+        }
+
+        Autodesk.Viewing.Document.load(
+            DOCUMENT_URN,
+            function onSuccess(doc) {
+            const node = doc.getRoot().getDefaultGeometry();
+            if (!node) { console.warn('No default geometry'); return; }
+            viewer.loadDocumentNode(doc, node, { keepCurrentModels: false }).then(function (model) {
+                modelLoaded = model;
+                console.log('Model loaded');
+
+                // Apply filtering and coloring
+                modelLoaded.getExternalIdMapping(
+                function onMap(map) {
+                    if (!map) {
+                    console.warn('externalId map not available');
+                    return;
+                    }
+                    
+                    const dbIds = [];
+                    const extColorMap = buildExternalColorMap(EXTERNAL_IDS);
+                    const THREE_REF = (Autodesk && Autodesk.Viewing && Autodesk.Viewing.Private && Autodesk.Viewing.Private.THREE) || window.THREE;
+                    const defaultV4 = colorStringToVec4('green', 0.85, THREE_REF);
+                    
+                    viewer.clearThemingColors();
+                    
+                    // Resolve and color the dbId of every external ID in EXTERNAL_IDS
+                    for (const extId in extColorMap) {
+                    const dbId = map[extId];
+                    if (!dbId) continue;
+                    dbIds.push(dbId);
+                    const color = extColorMap[extId];
+                    const v4 = color ? colorStringToVec4(color, 0.95, THREE_REF) : defaultV4;
+                    viewer.setThemingColor(dbId, v4, modelLoaded, false);
+                    }
+                    
+                    if (dbIds.length === 0) {
+                    console.info('No dbIds match EXTERNAL_IDS');
+                    return;
+                    }
+                    
+                    viewer.isolate(dbIds);
+                    viewer.fitToView(dbIds);
+                    viewer.impl.invalidate(true, true, true);
+                },
+                function onErr(err) {
+                    console.error('getExternalIdMapping failed', err);
+                }
+                );
+            });
+            },
+            function onFailure(code, message) {
+            console.error('Document load failed:', code, message);
+            }
+        );
+        }
+    );
+
+    // Helper functions
+    function buildExternalColorMap(obj) {
+        // EXTERNAL_IDS is already a flat { externalId: color } object
+        if (obj && typeof obj === 'object' && !Array.isArray(obj)) return obj;
+        return Object.create(null);
+    }
+
+    function colorStringToVec4(str, alphaDefault, THREE_REF) {
+        let a = typeof alphaDefault === 'number' ? alphaDefault : 0.85;
+        if (!str) return new THREE_REF.Vector4(0, 1, 0, a);
+
+        let s = String(str).trim().toLowerCase();
+        
+        // #rrggbb
+        if (s.startsWith('#') && s.length === 7) {
+        const r = parseInt(s.slice(1, 3), 16) / 255;
+        const g = parseInt(s.slice(3, 5), 16) / 255;
+        const b = parseInt(s.slice(5, 7), 16) / 255;
+        return new THREE_REF.Vector4(r, g, b, a);
+        }
+
+        // fallback to green
+        return new THREE_REF.Vector4(0, 1, 0, a);
+    }
+    </script>
+    </body>
+    </html>"""
+)
+
+
+@lru_cache(maxsize=128)
+def _build_category_summary_result(
+    required_categories: frozenset,
+    structural_counts: tuple,
+    electrical_counts: tuple,
+    has_structural: bool,
+    has_electrical: bool,
+) -> vkt.TableResult:
+    """
+    Build the category summary table of the models against the contract scope.
+
+    The result is memoized on its hashable inputs, so switching back to the
+    summary with unchanged models and contract skips rebuilding the table.
+
+    Args:
+        required_categories: Categories required by the contract
+        structural_counts: Sorted (category name, element count) pairs of the
+            structural model
+        electrical_counts: Sorted (category name, element count) pairs of the
+            electrical model
+        has_structural: Whether a structural file is selected
+        has_electrical: Whether an electrical file is selected
+
+    Returns:
+        TableResult showing which categories are present in the models
+    """
+    structural_counts = dict(structural_counts)
+    electrical_counts = dict(electrical_counts)
+
+    # Prepare table data with visual indicators
+    table_data = []
+    for category_name, total_count, bucket in _classify_categories(
+        required_categories, structural_counts, electrical_counts
+    ):
+        # Get element counts from both files
+        structural_count = structural_counts.get(category_name, 0)
+        electrical_count = electrical_counts.get(category_name, 0)
+
+        # Build element count display with breakdown
+        if has_structural and has_electrical:
+            count_display = (
+                f"{total_count} (S:{structural_count}, E:{electrical_count})"
+            )
+        elif has_structural:
+            count_display = f"{structural_count}"
+        else:
+            count_display = f"{electrical_count}"
+
+        # Determine status symbol, description, and color
+        style = STATUS_TABLE[bucket]
+        status_color = TABLE_COLOR_BY_BUCKET[bucket]
+
+        # Create colored cells for better visualization
+        status_cell = vkt.TableCell(
+            style.symbol, text_color=status_color, text_style="bold"
+        )
+
+        table_data.append([category_name, status_cell, count_display, style.text])
+
+    # Define column headers
+    column_headers = [
+        vkt.TableHeader("Category", align="left"),
+        vkt.TableHeader("Status", align="center"),
+        vkt.TableHeader("Element Count", align="right"),
+        vkt.TableHeader("Description", align="left"),
+    ]
+
+    return vkt.TableResult(
+        table_data, column_headers=column_headers, enable_sorting_and_filtering=True
+    )
+
+
+@lru_cache(maxsize=16)
+def _build_category_data_result(
+    required_categories: frozenset, category_counts: tuple
+) -> vkt.DataResult:
+    """
+    Build the category data summary of a model against the contract scope.
+
+    The result is memoized on its hashable inputs, so unchanged models and
+    contracts skip rebuilding the data groups.
+
+    Args:
+        required_categories: Categories required by the contract
+        category_counts: Sorted (category name, element count) pairs of the model
+
+    Returns:
+        DataResult with category status information
+    """
+    model_category_counts = dict(category_counts)
+
+    # Bucket the known categories with set arithmetic, the statistics and groups
+    # below share it
+    in_model = {name for name, count in category_counts if count > 0}
+    present_in_model = in_model & ALL_CATEGORY_SET
+    required = required_categories & ALL_CATEGORY_SET
+    bucket_categories = {
+        STATUS_PRESENT: required & present_in_model,
+        STATUS_MISSING_FROM_MODEL: required - present_in_model,
+        STATUS_MISSING_FROM_CONTRACT: present_in_model - required,
+        STATUS_NOT_APPLICABLE: ALL_CATEGORY_SET - required - present_in_model,
+    }
+
+    # Create main data group
+    main_group = vkt.DataGroup()
+
+    # Add summary statistics
+    total_categories = len(ALL_CATEGORIES)
+    categories_in_model = len(present_in_model)
+    categories_in_contract = len(required_categories)
+    categories_matched = len(required_categories & in_model)
+
+    summary_group = vkt.DataGroup(
+        vkt.DataItem("Total Categories", total_categories),
+        vkt.DataItem("Categories in Model", categories_in_model),
+        vkt.DataItem("Categories in Contract", categories_in_contract),
+        vkt.DataItem(
+            "Contract Categories Found",
+            categories_matched,
+            status=vkt.DataStatus.SUCCESS
+            if categories_matched == categories_in_contract
+            else vkt.DataStatus.WARNING,
+        ),
+    )
+    main_group.add(vkt.DataItem("Summary", subgroup=summary_group))
+
+    # Add category details grouped by status
+    present_group = vkt.DataGroup()
+    missing_from_model_group = vkt.DataGroup()
+    missing_from_contract_group = vkt.DataGroup()
+    not_applicable_group = vkt.DataGroup()
+
+    # Target group of each status bucket
+    bucket_groups = {
+        STATUS_PRESENT: present_group,
+        STATUS_MISSING_FROM_MODEL: missing_from_model_group,
+        STATUS_MISSING_FROM_CONTRACT: missing_from_contract_group,
+        STATUS_NOT_APPLICABLE: not_applicable_group,
+    }
+
+    for bucket, group in bucket_groups.items():
+        style = STATUS_TABLE[bucket]
+        # Keep the master list order within each group
+        for category_name in sorted(
+            bucket_categories[bucket], key=CATEGORY_ORDER.__getitem__
+        ):
+            element_count = model_category_counts.get(category_name, 0)
+            group.add(
+                vkt.DataItem(
+                    category_name,
+                    element_count if element_count > 0 else "0",
+                    suffix="elements",
+                    status=style.data_status,
+                    status_message=style.data_message,
+                )
+            )
+
+    # Add grouped categories to main group
+    if len(present_group) > 0:
+        main_group.add(
+            vkt.DataItem("✓ Present (Contract & Model)", subgroup=present_group)
+        )
+
+    if len(missing_from_model_group) > 0:
+        main_group.add(
+            vkt.DataItem("✗ Missing from Model", subgroup=missing_from_model_group)
+        )
+
+    if len(missing_from_contract_group) > 0:
+        main_group.add(
+            vkt.DataItem(
+                "⚠ Missing from Contract", subgroup=missing_from_contract_group
+            )
+        )
+
+    if len(not_applicable_group) > 0:
+        main_group.add(
+            vkt.DataItem("○ Not Applicable", subgroup=not_applicable_group)
+        )
+
+    return vkt.DataResult(main_group)
+
+
+def _docx_cell_xml(text, width, bold=False, color=None, center=False):
+    """
+    Build the WordprocessingML of a single-paragraph table cell.
+
+    Args:
+        text: Cell text
+        width: Cell width in twips
+        bold: Whether the text is bold
+        color: Optional hex RGB text color, e.g. "008000"
+        center: Whether the paragraph is centered
+
+    Returns:
+        XML string of the <w:tc> element
+    """
+    run_props = ""
+    if bold:
+        run_props += "<w:b/>"
+    if color:
+        run_props += f'<w:color w:val="{color}"/>'
+    paragraph_props = '<w:pPr><w:jc w:val="center"/></w:pPr>' if center else ""
+    return (
+        f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr>'
+        f"<w:p>{paragraph_props}<w:r><w:rPr>{run_props}</w:rPr>"
+        f'<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p></w:tc>'
+    )
+
+
+@lru_cache(maxsize=1)
+def _compliance_report_template() -> bytes:
+    """
+    Build the static skeleton of the contract compliance report once per process.
+
+    The title, legend and headings never change between downloads, so they are
+    serialized once and every report starts from a copy of these bytes. The
+    metadata and file paragraphs are placeholders filled in per report.
+
+    Returns:
+        The serialized .docx template as bytes
+    """
+    import io
+
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    # Create Word document
+    doc = Document()
+
+    # Add title
+    title = doc.add_heading("Contract Compliance Report", level=1)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Add metadata and file information placeholders
+    doc.add_paragraph("{{GENERATED}}")
+    doc.add_paragraph("{{FILES}}")
+
+    doc.add_paragraph("")
+
+    # Add legend
+    doc.add_heading("Legend", level=2)
+    legend_items = [
+        ("✓ Green", "Category is in contract and present in model(s)"),
+        ("✗ Orange", "Category is in contract but not in model(s)"),
+        ("✗ Red", "Category is in model(s) but missing from contract"),
+        ("✗ Gray", "Category is neither in contract nor in model(s)"),
+    ]
+    for symbol, description in legend_items:
+        doc.add_paragraph(f"{symbol}: {description}", style="List Bullet")
+
+    doc.add_paragraph("")
+
+    # Add table heading, the table itself is appended per report
+    doc.add_heading("Category Details", level=2)
+
+    template_io = io.BytesIO()
+    doc.save(template_io)
+    return template_io.getvalue()
+
+
+def _render_compliance_report_docx(generated_line, file_lines, rows):
+    """
+    Render the contract compliance report as a Word document.
+
+    All document layout (title, legend, table styling and status colors) lives
+    here so the download view only has to prepare the data.
+
+    Args:
+        generated_line: Text of the "Generated: ..." metadata paragraph
+        file_lines: Paragraphs describing the source model files
+        rows: Tuples of (category name, count display, status bucket), one per
+            table row
+
+    Returns:
+        The serialized .docx document as bytes
+    """
+    import io
+
+    from docx import Document
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+    from docx.shared import Emu
+
+    # Start from a copy of the cached report skeleton
+    doc = Document(io.BytesIO(_compliance_report_template()))
+    placeholders = {p.text: p for p in doc.paragraphs if p.text.startswith("{{")}
+
+    # Fill in metadata and file information
+    placeholders["{{GENERATED}}"].text = generated_line
+    files_placeholder = placeholders["{{FILES}}"]
+    for line in file_lines:
+        files_placeholder.insert_paragraph_before(line)
+    files_placeholder._p.getparent().remove(files_placeholder._p)
+
+    # The skeleton ends with the Category Details heading
+    details_heading = doc.paragraphs[-1]
+
+    # Build the 4 column table as one XML fragment instead of per-row tree edits
+    section = doc.sections[0]
+    text_width = section.page_width - section.left_margin - section.right_margin
+    col_width = Emu(text_width).twips // 4
+    header_row = "".join(
+        _docx_cell_xml(text, col_width, bold=True)
+        for text in ("Category", "Status", "Element Count", "Description")
+    )
+    data_rows = []
+    for category_name, count_display, bucket in rows:
+        # Determine status symbol, description, and color
+        style = STATUS_TABLE[bucket]
+        data_rows.append(
+            "<w:tr>"
+            + _docx_cell_xml(category_name, col_width)
+            + _docx_cell_xml(
+                style.symbol,
+                col_width,
+                bold=True,
+                color=DOCX_COLOR_BY_BUCKET[bucket],
+                center=True,
+            )
+            + _docx_cell_xml(count_display, col_width, center=True)
+            + _docx_cell_xml(style.text, col_width)
+            + "</w:tr>"
+        )
+    table_xml = (
+        f"<w:tbl {nsdecls('w')}>"
+        "<w:tblPr>"
+        f'<w:tblStyle w:val="{doc.styles["Light Grid Accent 1"].style_id}"/>'
+        '<w:tblW w:type="auto" w:w="0"/>'
+        '<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1"'
+        ' w:lastColumn="0" w:noHBand="0" w:noVBand="1"/>'
+        "</w:tblPr>"
+        "<w:tblGrid>" + f'<w:gridCol w:w="{col_width}"/>' * 4 + "</w:tblGrid>"
+        f"<w:tr>{header_row}</w:tr>" + "".join(data_rows) + "</w:tbl>"
+    )
+    details_heading._p.addnext(parse_xml(table_xml))
 
-    return body.get("data", {})
+    # Save document to BytesIO, getvalue() does not depend on the position
+    doc_io = io.BytesIO()
+    doc.save(doc_io)
+    return doc_io.getvalue()
 
 
 class Parametrization(vkt.Parametrization):
@@ -99,28 +1372,7 @@ class Parametrization(vkt.Parametrization):
     )
     step_2.required_categories.category = vkt.OptionField(
         "Category",
-        options=[
-            "Structural Framing",
-            "Structural Columns",
-            "Structural Foundations",
-            "Walls",
-            "Floors",
-            "Roofs",
-            "Ceilings",
-            "Doors",
-            "Windows",
-            "Stairs",
-            "Railings",
-            "Curtain Panels",
-            "Curtain Wall Mullions",
-            "Furniture",
-            "Mechanical Equipment",
-            "Plumbing Fixtures",
-            "Lighting Fixtures",
-            "Electrical Equipment",
-            "Ducts",
-            "Pipes",
-        ],
+        options=list(ALL_CATEGORIES),
     )
     step_2.required_categories.color = vkt.ColorField(
         "Highlight Color", default=vkt.Color(0, 255, 0)
@@ -212,9 +1464,7 @@ class Controller(vkt.Controller):
                 "Please select an Autodesk file from the input field above"
             )
 
-        # Initialize the OAuth2 integration and get access token
-        integration = vkt.external.OAuth2Integration("autodesk-integration")
-        token = integration.get_access_token()
+        token = _get_autodesk_token()
 
         # Return the Autodesk viewer result
         return vkt.AutodeskResult(params.step_1.autodesk_file, access_token=token)
@@ -240,182 +1490,27 @@ class Controller(vkt.Controller):
                 "Please select at least one Autodesk file (structural or electrical)"
             )
 
-        # Initialize the OAuth2 integration and get access token
-        integration = vkt.external.OAuth2Integration("autodesk-integration")
-        token = integration.get_access_token()
-
-        # Collect category counts from both files
-        structural_counts = {}
-        electrical_counts = {}
+        token = _get_autodesk_token()
 
         # Extract required categories from dynamic array
-        required_categories = set(
+        required_categories = {
             row["category"] for row in params.step_2.required_categories
-        )
-
-        # Define the master list of categories (same as dropdown options)
-        all_categories = [
-            "Structural Framing",
-            "Structural Columns",
-            "Structural Foundations",
-            "Walls",
-            "Floors",
-            "Roofs",
-            "Ceilings",
-            "Doors",
-            "Windows",
-            "Stairs",
-            "Railings",
-            "Curtain Panels",
-            "Curtain Wall Mullions",
-            "Furniture",
-            "Mechanical Equipment",
-            "Plumbing Fixtures",
-            "Lighting Fixtures",
-            "Electrical Equipment",
-            "Ducts",
-            "Pipes",
-        ]
-
-        # Query to get all distinct categories in a model with their counts
-        query = """
-        query UsedCategories($elementGroupId: ID!, $limit: Int!) {
-          distinctPropertyValuesInElementGroupByName(
-            elementGroupId: $elementGroupId
-            name: "Category"
-            filter: { query: "'property.name.Element Context'==Instance" }
-          ) {
-            results {
-              values(limit: $limit) {
-                value
-                count
-              }
-            }
-          }
         }
-        """
-
-        # Fetch from structural file if provided
-        if params.step_1.autodesk_file:
-            vkt.progress_message(
-                "Fetching categories from structural file...", percentage=20
-            )
-            try:
-                region = params.step_1.autodesk_file.get_region(token)
-                group_id = (
-                    params.step_1.autodesk_file.get_aec_data_model_element_group_id(
-                        token
-                    )
-                )
-
-                variables = {"elementGroupId": group_id, "limit": 1000}
-                data = execute_graphql(query, token, region, variables)
-                block = data.get("distinctPropertyValuesInElementGroupByName") or {}
-                results_list = block.get("results") or []
-
-                for r in results_list:
-                    values = r.get("values") or []
-                    for v in values:
-                        category_name = v.get("value", "")
-                        element_count = v.get("count", 0)
-                        if category_name:
-                            structural_counts[category_name] = element_count
-
-            except Exception as e:
-                vkt.UserMessage.warning(
-                    f"Failed to fetch categories from structural file: {str(e)}"
-                )
-
-        # Fetch from electrical file if provided
-        if params.step_1.autodesk_file_electrical:
-            vkt.progress_message(
-                "Fetching categories from electrical file...", percentage=50
-            )
-            try:
-                region = params.step_1.autodesk_file_electrical.get_region(token)
-                group_id = params.step_1.autodesk_file_electrical.get_aec_data_model_element_group_id(
-                    token
-                )
-
-                variables = {"elementGroupId": group_id, "limit": 1000}
-                data = execute_graphql(query, token, region, variables)
-                block = data.get("distinctPropertyValuesInElementGroupByName") or {}
-                results_list = block.get("results") or []
-
-                for r in results_list:
-                    values = r.get("values") or []
-                    for v in values:
-                        category_name = v.get("value", "")
-                        element_count = v.get("count", 0)
-                        if category_name:
-                            electrical_counts[category_name] = element_count
-
-            except Exception as e:
-                vkt.UserMessage.warning(
-                    f"Failed to fetch categories from electrical file: {str(e)}"
-                )
-
-        vkt.progress_message("Preparing category summary...", percentage=80)
-
-        # Prepare table data with visual indicators
-        table_data = []
-        for category_name in all_categories:
-            # Get element counts from both files
-            structural_count = structural_counts.get(category_name, 0)
-            electrical_count = electrical_counts.get(category_name, 0)
-            total_count = structural_count + electrical_count
-
-            # Check if category is in any model
-            in_model = total_count > 0
-
-            # Check if category is in required categories
-            in_contract = category_name in required_categories
 
-            # Build element count display with breakdown
-            if params.step_1.autodesk_file and params.step_1.autodesk_file_electrical:
-                count_display = (
-                    f"{total_count} (S:{structural_count}, E:{electrical_count})"
-                )
-            elif params.step_1.autodesk_file:
-                count_display = f"{structural_count}"
-            else:
-                count_display = f"{electrical_count}"
-
-            # Determine status symbol and description
-            if in_contract and in_model:
-                status_symbol = "✓"
-                status_text = "Present in contract and model(s)"
-                status_color = vkt.Color(0, 128, 0)  # Green
-            elif in_contract and not in_model:
-                status_symbol = "✗"
-                status_text = "In contract but not in model(s)"
-                status_color = vkt.Color(255, 165, 0)  # Orange
-            elif not in_contract and in_model:
-                status_symbol = "✗"
-                status_text = "Missing in the contract"
-                status_color = vkt.Color(255, 0, 0)  # Red
-            else:  # not in_contract and not in_model
-                status_symbol = "✗"
-                status_text = "Not in contract, not in model(s)"
-                status_color = vkt.Color(128, 128, 128)  # Gray
-
-            # Create colored cells for better visualization
-            status_cell = vkt.TableCell(
-                status_symbol, text_color=status_color, text_style="bold"
-            )
-
-            table_data.append([category_name, status_cell, count_display, status_text])
+        # Collect category counts from both files, fetched concurrently
+        _report_progress("Fetching categories from model files...", percentage=20)
+        structural_counts, electrical_counts = _fetch_files_category_counts(
+            params.step_1.autodesk_file, params.step_1.autodesk_file_electrical, token
+        )
 
-        # Define column headers
-        column_headers = [
-            vkt.TableHeader("Category", align="left"),
-            vkt.TableHeader("Status", align="center"),
-            vkt.TableHeader("Element Count", align="right"),
-            vkt.TableHeader("Description", align="left"),
-        ]
+        _report_progress("Preparing category summary...", percentage=80)
 
-        return vkt.TableResult(
-            table_data, column_headers=column_headers, enable_sorting_and_filtering=True
+        return _build_category_summary_result(
+            frozenset(required_categories),
+            tuple(sorted(structural_counts.items())),
+            tuple(sorted(electrical_counts.items())),
+            bool(params.step_1.autodesk_file),
+            bool(params.step_1.autodesk_file_electrical),
         )
 
     @vkt.WebView("Colored Category View", duration_guess=15)
@@ -429,274 +1524,70 @@ class Controller(vkt.Controller):
                 "Please select an Autodesk file from the input field above"
             )
 
-        # Initialize the OAuth2 integration and get access token
-        integration = vkt.external.OAuth2Integration("autodesk-integration")
-        token = integration.get_access_token()
+        token = _get_autodesk_token()
 
         # Get the URN from the Autodesk file and encode it properly
         autodesk_file = params.step_1.autodesk_file
-        region = autodesk_file.get_region(token)
-        group_id = autodesk_file.get_aec_data_model_element_group_id(token)
+        region, group_id, urn = _get_file_metadata(autodesk_file, token)
 
-        # Get the latest version URN and encode it like in your working example
-        latest_version = autodesk_file.get_latest_version(token)
-        urn = latest_version.urn
+        # Encode the latest version URN like in your working example
         import base64
 
         urn_bs64 = base64.urlsafe_b64encode(urn.encode()).decode().rstrip("=")
 
-        vkt.progress_message(
+        _report_progress(
             "Fetching element external IDs for selected categories...", percentage=20
         )
 
-        # Build a list of external IDs with their colors for each category
-        external_ids_with_colors = []
-
-        for row in params.step_2.required_categories:
-            category_name = row["category"]
-            color = row["color"]
-
-            # Convert VIKTOR Color to hex format
-            color_hex = color.hex
-
-            vkt.progress_message(f"Fetching {category_name} elements...", percentage=30)
-
-            # GraphQL query to get element IDs and their external IDs
-            query = """
-            query CategoryElements($elementGroupId: ID!, $rsqlFilter: String!, $pagination: PaginationInput) {
-            elementsByElementGroup(
-                elementGroupId: $elementGroupId,
-                filter: { query: $rsqlFilter },
-                pagination: $pagination
-            ) {
-                pagination { cursor pageSize }
-                results {
-                id
-                name
-                alternativeIdentifiers {
-                    externalElementId
-                }
-                }
-            }
-            }
-            """
-
-            # Construct RSQL filter for this category
-            rsql_filter = f"property.name.category=='{category_name}' and 'property.name.Element Context'==Instance"
-
-            # Fetch all elements with pagination
-            cursor = None
-            limit = 100
-
-            while True:
-                variables = {
-                    "elementGroupId": group_id,
-                    "rsqlFilter": rsql_filter,
-                    "pagination": {"limit": limit}
-                    if not cursor
-                    else {"cursor": cursor, "limit": limit},
-                }
-
-                try:
-                    data = execute_graphql(query, token, region, variables)
-                    block = data.get("elementsByElementGroup", {}) or {}
-                    page_results = block.get("results", []) or []
-
-                    # Collect external IDs with their colors
-                    for element in page_results:
-                        # Get External ID from alternativeIdentifiers
-                        alt_ids = element.get("alternativeIdentifiers", {})
-                        external_id = alt_ids.get("externalElementId")
-
-                        # If External ID found, add it with its color
-                        if external_id:
-                            # Create a single-key object as expected by the viewer script
-                            external_ids_with_colors.append({external_id: color_hex})
-
-                    # Check pagination
-                    page = block.get("pagination", {}) or {}
-                    new_cursor = page.get("cursor")
-
-                    # Stop on empty cursor, repeated cursor, or empty page
-                    if not new_cursor or new_cursor == cursor or len(page_results) == 0:
-                        break
-
-                    cursor = new_cursor
-
-                except Exception as e:
-                    vkt.UserMessage.warning(
-                        f"Could not fetch elements for category '{category_name}': {str(e)}"
-                    )
-                    break
-
-        vkt.progress_message("Preparing viewer...", percentage=80)
-
-        # Convert Python list to JSON string for JavaScript
-        import json
-
-        external_ids_json = json.dumps(external_ids_with_colors)
-
-        # Use the same HTML template approach as your working example
-        html_template = """<!DOCTYPE html>
-    <html>
-    <head>
-    <meta charset="utf-8" />
-    <title>APS Viewer - Colored Categories</title>
-    <link rel="stylesheet" href="https://developer.api.autodesk.com/modelderivative/v2/viewers/7.*/style.min.css" type="text/css">
-    <script src="https://developer.api.autodesk.com/modelderivative/v2/viewers/7.*/viewer3D.min.js"></script>
-    <style>
-        html, body, #apsViewerDiv { width: 100%; height: 100%; margin: 0; }
-    </style>
-    </head>
-    <body>
-    <div id="apsViewerDiv"></div>
-
-    <script>
-    // Injected external IDs from backend
-    var EXTERNAL_IDS = EXTERNAL_IDS_PLACEHOLDER;
-    // Replace these three in your backend
-    var ACCESS_TOKEN = 'APS_TOKEN_PLACEHOLDER';
-    var DOCUMENT_URN = 'urn:URN_PLACEHOLDER';
-    
-    console.log('External IDs:', EXTERNAL_IDS);
-
-    // Disable analytics for sandbox iframes
-    try { Autodesk.Viewing.Private.analytics.optOut(); } catch (e) {}
-
-    let viewer = null;
-    let modelLoaded = null;
-
-    Autodesk.Viewing.Initializer(
-        { env: 'AutodeskProduction2', api: 'streamingV2', accessToken: ACCESS_TOKEN },
-        function () {
-        const container = document.getElementById('apsViewerDiv');
-        viewer = new Autodesk.Viewing.GuiViewer3D(container, { disableBimWalkInfoIcon: true });
-        viewer.start();
-        console.log('Viewer started');
-
-        if (!DOCUMENT_URN) {
-            console.error('Missing URN');
-            return;
-        }
-
-        Autodesk.Viewing.Document.load(
-            DOCUMENT_URN,
-            function onSuccess(doc) {
-            const node = doc.getRoot().getDefaultGeometry();
-            if (!node) { console.warn('No default geometry'); return; }
-            viewer.loadDocumentNode(doc, node, { keepCurrentModels: false }).then(function (model) {
-                modelLoaded = model;
-                console.log('Model loaded');
-
-                // Apply filtering and coloring
-                modelLoaded.getExternalIdMapping(
-                function onMap(map) {
-                    if (!map) {
-                    console.warn('externalId map not available');
-                    return;
-                    }
-                    
-                    const dbIds = [];
-                    const extColorMap = buildExternalColorMap(EXTERNAL_IDS);
-                    const rev = {}; // dbId -> externalId
-                    
-                    for (const extId in map) {
-                    if (Object.prototype.hasOwnProperty.call(map, extId)) {
-                        rev[ map[extId] ] = extId;
-                    }
-                    }
-                    
-                    // Collect dbIds for all external IDs in EXTERNAL_IDS
-                    for (const extId in extColorMap) {
-                    if (map[extId]) {
-                        dbIds.push(map[extId]);
-                    }
-                    }
-                    
-                    if (dbIds.length === 0) {
-                    console.info('No dbIds match EXTERNAL_IDS');
-                    return;
-                    }
-                    
-                    viewer.clearThemingColors();
-                    viewer.isolate(dbIds);
-                    viewer.fitToView(dbIds);
-                    
-                    // Apply colors
-                    const THREE_REF = (Autodesk && Autodesk.Viewing && Autodesk.Viewing.Private && Autodesk.Viewing.Private.THREE) || window.THREE;
-                    const defaultV4 = colorStringToVec4('green', 0.85, THREE_REF);
-                    
-                    for (let i = 0; i < dbIds.length; i++) {
-                    viewer.setThemingColor(dbIds[i], defaultV4, modelLoaded, false);
-                    }
-                    
-                    // Apply overrides from extColorMap
-                    for (let i = 0; i < dbIds.length; i++) {
-                    const dbId = dbIds[i];
-                    const ext = rev[dbId];
-                    if (ext && extColorMap[ext]) {
-                        const v4 = colorStringToVec4(extColorMap[ext], 0.95, THREE_REF);
-                        viewer.setThemingColor(dbId, v4, modelLoaded, false);
-                    }
-                    }
-                    viewer.impl.invalidate(true, true, true);
-                },
-                function onErr(err) {
-                    console.error('getExternalIdMapping failed', err);
-                }
-                );
-            });
-            },
-            function onFailure(code, message) {
-            console.error('Document load failed:', code, message);
-            }
-        );
+        # Map each selected category to its color in hex format. A category
+        # selected twice is queried once, with the last color winning as it
+        # would in the viewer.
+        category_colors = {
+            row["category"]: row["color"].hex
+            for row in params.step_2.required_categories
+            if row["category"]
         }
-    );
 
-    // Helper functions
-    function buildExternalColorMap(list) {
-        const map = Object.create(null);
-        if (!Array.isArray(list)) return map;
-        for (let i = 0; i < list.length; i++) {
-        const obj = list[i];
-        if (obj && typeof obj === 'object') {
-            const keys = Object.keys(obj);
-            if (keys.length === 1) {
-            const extId = String(keys[0]);
-            const color = String(obj[extId] || '').trim();
-            if (extId && color) map[extId] = color;
-            }
-        }
-        }
-        return map;
-    }
+        # Skip categories without instances, they would only cost empty requests.
+        # The counts are usually cached by the summary views already.
+        category_names = list(category_colors)
+        try:
+            category_counts = _fetch_model_category_counts(
+                token, region, group_id, urn, _extra_categories(category_names)
+            )
+            category_names = [c for c in category_names if category_counts.get(c, 0)]
+        except (GraphQLError, vkt.UserError) as e:
+            # The count query failed on this model, the element queries may still
+            # work, so fall back to querying every selected category
+            vkt.UserMessage.warning(
+                "Could not count the elements per category, querying all selected "
+                f"categories: {str(e)}"
+            )
+        except RuntimeError as e:
+            # HTTP failures would fail the element queries as well
+            raise vkt.UserError(f"Failed to fetch categories from model: {str(e)}")
 
-    function colorStringToVec4(str, alphaDefault, THREE_REF) {
-        let a = typeof alphaDefault === 'number' ? alphaDefault : 0.85;
-        if (!str) return new THREE_REF.Vector4(0, 1, 0, a);
+        # Map each external ID to its color, one page at a time
+        external_ids_with_colors = {}
+        try:
+            for category_name, external_id in _iter_categories_external_ids(
+                category_names, group_id, token, region
+            ):
+                external_ids_with_colors[external_id] = category_colors[category_name]
+        except Exception as e:
+            vkt.UserMessage.warning(
+                f"Could not fetch elements for the selected categories: {str(e)}"
+            )
 
-        let s = String(str).trim().toLowerCase();
-        
-        // #rrggbb
-        if (s.startsWith('#') && s.length === 7) {
-        const r = parseInt(s.slice(1, 3), 16) / 255;
-        const g = parseInt(s.slice(3, 5), 16) / 255;
-        const b = parseInt(s.slice(5, 7), 16) / 255;
-        return new THREE_REF.Vector4(r, g, b, a);
-        }
+        _report_progress("Preparing viewer...", percentage=80)
 
-        // fallback to green
-        return new THREE_REF.Vector4(0, 1, 0, a);
-    }
-    </script>
-    </body>
-    </html>"""
+        # Convert Python dict to JSON string for JavaScript
+        external_ids_json = json.dumps(external_ids_with_colors)
 
-        # Use placeholder replacement like in your working example
-        html = html_template.replace("APS_TOKEN_PLACEHOLDER", token)
-        html = html.replace("URN_PLACEHOLDER", urn_bs64)
-        html = html.replace("EXTERNAL_IDS_PLACEHOLDER", external_ids_json)
+        # Fill in the viewer template in a single pass
+        html = VIEWER_HTML_TEMPLATE.safe_substitute(
+            APS_TOKEN=token, URN=urn_bs64, EXTERNAL_IDS=external_ids_json
+        )
 
         return vkt.WebResult(html=html)
 
@@ -717,201 +1608,37 @@ class Controller(vkt.Controller):
                 "Please select an Autodesk file from the input field above"
             )
 
-        # Initialize the OAuth2 integration and get access token
-        integration = vkt.external.OAuth2Integration("autodesk-integration")
-        token = integration.get_access_token()
+        token = _get_autodesk_token()
 
-        # Get region and AEC Data Model element group ID from the Autodesk file
-        region = params.step_1.autodesk_file.get_region(token)
-        group_id = params.step_1.autodesk_file.get_aec_data_model_element_group_id(
-            token
+        # Get region, AEC Data Model element group ID and version from the Autodesk file
+        region, group_id, version_urn = _get_file_metadata(
+            params.step_1.autodesk_file, token
         )
 
         # Extract required categories from dynamic array
-        required_categories = set(
+        required_categories = {
             row["category"] for row in params.step_2.required_categories
-        )
-
-        # Define the master list of categories (same as dropdown options)
-        all_categories = [
-            "Structural Framing",
-            "Structural Columns",
-            "Structural Foundations",
-            "Walls",
-            "Floors",
-            "Roofs",
-            "Ceilings",
-            "Doors",
-            "Windows",
-            "Stairs",
-            "Railings",
-            "Curtain Panels",
-            "Curtain Wall Mullions",
-            "Furniture",
-            "Mechanical Equipment",
-            "Plumbing Fixtures",
-            "Lighting Fixtures",
-            "Electrical Equipment",
-            "Ducts",
-            "Pipes",
-        ]
-
-        vkt.progress_message("Fetching category counts from model...", percentage=10)
-
-        # Query to get all distinct categories in the model with their counts
-        query = """
-        query UsedCategories($elementGroupId: ID!, $limit: Int!) {
-          distinctPropertyValuesInElementGroupByName(
-            elementGroupId: $elementGroupId
-            name: "Category"
-            filter: { query: "'property.name.Element Context'==Instance" }
-          ) {
-            results {
-              values(limit: $limit) {
-                value
-                count
-              }
-            }
-          }
         }
-        """
 
-        variables = {
-            "elementGroupId": group_id,
-            "limit": 1000,  # High limit to get all categories
-        }
+        _report_progress("Fetching category counts from model...", percentage=10)
 
         try:
-            data = execute_graphql(query, token, region, variables)
-            block = data.get("distinctPropertyValuesInElementGroupByName") or {}
-            results_list = block.get("results") or []
-
-            # Create a dictionary of category counts from the model
-            model_category_counts = {}
-            for r in results_list:
-                values = r.get("values") or []
-                for v in values:
-                    category_name = v.get("value", "")
-                    element_count = v.get("count", 0)
-                    if category_name:
-                        model_category_counts[category_name] = element_count
-
+            model_category_counts = _fetch_model_category_counts(
+                token,
+                region,
+                group_id,
+                version_urn,
+                _extra_categories(required_categories),
+            )
         except Exception as e:
             raise vkt.UserError(f"Failed to fetch categories from model: {str(e)}")
 
-        vkt.progress_message("Preparing category data summary...", percentage=80)
-
-        # Create main data group
-        main_group = vkt.DataGroup()
-
-        # Add summary statistics
-        total_categories = len(all_categories)
-        categories_in_model = sum(
-            1 for cat in all_categories if model_category_counts.get(cat, 0) > 0
-        )
-        categories_in_contract = len(required_categories)
-        categories_matched = sum(
-            1 for cat in required_categories if model_category_counts.get(cat, 0) > 0
-        )
+        _report_progress("Preparing category data summary...", percentage=80)
 
-        summary_group = vkt.DataGroup(
-            vkt.DataItem("Total Categories", total_categories),
-            vkt.DataItem("Categories in Model", categories_in_model),
-            vkt.DataItem("Categories in Contract", categories_in_contract),
-            vkt.DataItem(
-                "Contract Categories Found",
-                categories_matched,
-                status=vkt.DataStatus.SUCCESS
-                if categories_matched == categories_in_contract
-                else vkt.DataStatus.WARNING,
-            ),
+        return _build_category_data_result(
+            frozenset(required_categories),
+            tuple(sorted(model_category_counts.items())),
         )
-        main_group.add(vkt.DataItem("Summary", subgroup=summary_group))
-
-        # Add category details grouped by status
-        present_group = vkt.DataGroup()
-        missing_from_model_group = vkt.DataGroup()
-        missing_from_contract_group = vkt.DataGroup()
-        not_applicable_group = vkt.DataGroup()
-
-        for category_name in all_categories:
-            # Check if category is in the model
-            element_count = model_category_counts.get(category_name, 0)
-            in_model = element_count > 0
-
-            # Check if category is in required categories
-            in_contract = category_name in required_categories
-
-            # Categorize and add to appropriate group
-            if in_contract and in_model:
-                # Present in both contract and model - SUCCESS
-                present_group.add(
-                    vkt.DataItem(
-                        category_name,
-                        element_count,
-                        suffix="elements",
-                        status=vkt.DataStatus.SUCCESS,
-                        status_message="✓ Present in contract and model",
-                    )
-                )
-            elif in_contract and not in_model:
-                # In contract but not in model - ERROR
-                missing_from_model_group.add(
-                    vkt.DataItem(
-                        category_name,
-                        "0",
-                        suffix="elements",
-                        status=vkt.DataStatus.ERROR,
-                        status_message="✗ In contract but not in model",
-                    )
-                )
-            elif not in_contract and in_model:
-                # In model but missing from contract - WARNING
-                missing_from_contract_group.add(
-                    vkt.DataItem(
-                        category_name,
-                        element_count,
-                        suffix="elements",
-                        status=vkt.DataStatus.WARNING,
-                        status_message="✗ Missing in the contract",
-                    )
-                )
-            else:
-                # Not in contract and not in model - INFO
-                not_applicable_group.add(
-                    vkt.DataItem(
-                        category_name,
-                        "0",
-                        suffix="elements",
-                        status=vkt.DataStatus.INFO,
-                        status_message="Not in contract, not in model",
-                    )
-                )
-
-        # Add grouped categories to main group
-        if len(present_group) > 0:
-            main_group.add(
-                vkt.DataItem("✓ Present (Contract & Model)", subgroup=present_group)
-            )
-
-        if len(missing_from_model_group) > 0:
-            main_group.add(
-                vkt.DataItem("✗ Missing from Model", subgroup=missing_from_model_group)
-            )
-
-        if len(missing_from_contract_group) > 0:
-            main_group.add(
-                vkt.DataItem(
-                    "⚠ Missing from Contract", subgroup=missing_from_contract_group
-                )
-            )
-
-        if len(not_applicable_group) > 0:
-            main_group.add(
-                vkt.DataItem("○ Not Applicable", subgroup=not_applicable_group)
-            )
-
-        return vkt.DataResult(main_group)
 
     def download_contract_compliance_report(self, params, **kwargs):
         """
@@ -924,13 +1651,8 @@ class Controller(vkt.Controller):
         Returns:
             DownloadResult with the Word document
         """
-        import io
         from datetime import datetime
 
-        from docx import Document
-        from docx.enum.text import WD_ALIGN_PARAGRAPH
-        from docx.shared import RGBColor
-
         if (
             not params.step_1.autodesk_file
             and not params.step_1.autodesk_file_electrical
@@ -939,253 +1661,68 @@ class Controller(vkt.Controller):
                 "Please select at least one Autodesk file (structural or electrical)"
             )
 
-        # Initialize the OAuth2 integration and get access token
-        integration = vkt.external.OAuth2Integration("autodesk-integration")
-        token = integration.get_access_token()
-
-        # Collect category counts from both files
-        structural_counts = {}
-        electrical_counts = {}
+        token = _get_autodesk_token()
 
         # Extract required categories from dynamic array
-        required_categories = set(
+        required_categories = {
             row["category"] for row in params.step_2.required_categories
-        )
-
-        # Define the master list of categories (same as dropdown options)
-        all_categories = [
-            "Structural Framing",
-            "Structural Columns",
-            "Structural Foundations",
-            "Walls",
-            "Floors",
-            "Roofs",
-            "Ceilings",
-            "Doors",
-            "Windows",
-            "Stairs",
-            "Railings",
-            "Curtain Panels",
-            "Curtain Wall Mullions",
-            "Furniture",
-            "Mechanical Equipment",
-            "Plumbing Fixtures",
-            "Lighting Fixtures",
-            "Electrical Equipment",
-            "Ducts",
-            "Pipes",
-        ]
-
-        # Query to get all distinct categories in a model with their counts
-        query = """
-        query UsedCategories($elementGroupId: ID!, $limit: Int!) {
-          distinctPropertyValuesInElementGroupByName(
-            elementGroupId: $elementGroupId
-            name: "Category"
-            filter: { query: "'property.name.Element Context'==Instance" }
-          ) {
-            results {
-              values(limit: $limit) {
-                value
-                count
-              }
-            }
-          }
         }
-        """
-
-        # Fetch from structural file if provided
-        if params.step_1.autodesk_file:
-            vkt.progress_message(
-                "Fetching categories from structural file...", percentage=10
-            )
-            try:
-                region = params.step_1.autodesk_file.get_region(token)
-                group_id = (
-                    params.step_1.autodesk_file.get_aec_data_model_element_group_id(
-                        token
-                    )
-                )
-
-                variables = {"elementGroupId": group_id, "limit": 1000}
-                data = execute_graphql(query, token, region, variables)
-                block = data.get("distinctPropertyValuesInElementGroupByName") or {}
-                results_list = block.get("results") or []
-
-                for r in results_list:
-                    values = r.get("values") or []
-                    for v in values:
-                        category_name = v.get("value", "")
-                        element_count = v.get("count", 0)
-                        if category_name:
-                            structural_counts[category_name] = element_count
-
-            except Exception as e:
-                vkt.UserMessage.warning(
-                    f"Failed to fetch categories from structural file: {str(e)}"
-                )
-
-        # Fetch from electrical file if provided
-        if params.step_1.autodesk_file_electrical:
-            vkt.progress_message(
-                "Fetching categories from electrical file...", percentage=30
-            )
-            try:
-                region = params.step_1.autodesk_file_electrical.get_region(token)
-                group_id = params.step_1.autodesk_file_electrical.get_aec_data_model_element_group_id(
-                    token
-                )
 
-                variables = {"elementGroupId": group_id, "limit": 1000}
-                data = execute_graphql(query, token, region, variables)
-                block = data.get("distinctPropertyValuesInElementGroupByName") or {}
-                results_list = block.get("results") or []
-
-                for r in results_list:
-                    values = r.get("values") or []
-                    for v in values:
-                        category_name = v.get("value", "")
-                        element_count = v.get("count", 0)
-                        if category_name:
-                            electrical_counts[category_name] = element_count
-
-            except Exception as e:
-                vkt.UserMessage.warning(
-                    f"Failed to fetch categories from electrical file: {str(e)}"
-                )
-
-        vkt.progress_message("Generating Word document...", percentage=60)
-
-        # Create Word document
-        doc = Document()
+        # Collect category counts from both files, fetched concurrently
+        _report_progress("Fetching categories from model files...", percentage=10)
+        structural_counts, electrical_counts = _fetch_files_category_counts(
+            params.step_1.autodesk_file, params.step_1.autodesk_file_electrical, token
+        )
 
-        # Add title
-        title = doc.add_heading("Contract Compliance Report", level=1)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        _report_progress("Generating Word document...", percentage=60)
 
-        # Add metadata
-        doc.add_paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        structural_file = params.step_1.autodesk_file
+        electrical_file = params.step_1.autodesk_file_electrical
 
-        # Add file information
-        if params.step_1.autodesk_file and params.step_1.autodesk_file_electrical:
-            doc.add_paragraph(
-                f"Structural File: {params.step_1.autodesk_file.url.split('/')[-1]}"
-            )
-            doc.add_paragraph(
-                f"Electrical File: {params.step_1.autodesk_file_electrical.url.split('/')[-1]}"
+        # File information lines shown under the report title
+        file_lines = []
+        if structural_file:
+            file_lines.append(
+                f"Structural File: {structural_file.url.rpartition('/')[2]}"
             )
-        elif params.step_1.autodesk_file:
-            doc.add_paragraph(
-                f"Structural File: {params.step_1.autodesk_file.url.split('/')[-1]}"
-            )
-        else:
-            doc.add_paragraph(
-                f"Electrical File: {params.step_1.autodesk_file_electrical.url.split('/')[-1]}"
+        if electrical_file:
+            file_lines.append(
+                f"Electrical File: {electrical_file.url.rpartition('/')[2]}"
             )
 
-        doc.add_paragraph("")
-
-        # Add legend
-        doc.add_heading("Legend", level=2)
-        legend_items = [
-            ("✓ Green", "Category is in contract and present in model(s)"),
-            ("✗ Orange", "Category is in contract but not in model(s)"),
-            ("✗ Red", "Category is in model(s) but missing from contract"),
-            ("✗ Gray", "Category is neither in contract nor in model(s)"),
-        ]
-        for symbol, description in legend_items:
-            doc.add_paragraph(f"{symbol}: {description}", style="List Bullet")
-
-        doc.add_paragraph("")
-
-        # Add table
-        doc.add_heading("Category Details", level=2)
-
-        # Create table with 4 columns (added Element Count column)
-        table = doc.add_table(rows=1, cols=4)
-        table.style = "Light Grid Accent 1"
-
-        # Add header row
-        header_cells = table.rows[0].cells
-        header_cells[0].text = "Category"
-        header_cells[1].text = "Status"
-        header_cells[2].text = "Element Count"
-        header_cells[3].text = "Description"
-
-        # Make header bold
-        for cell in header_cells:
-            for paragraph in cell.paragraphs:
-                for run in paragraph.runs:
-                    run.font.bold = True
-
-        # Add data rows
-        for category_name in all_categories:
+        # Precompute the table rows, the renderer only handles layout
+        rows = []
+        for category_name, total_count, bucket in _classify_categories(
+            required_categories, structural_counts, electrical_counts
+        ):
             # Get element counts from both files
             structural_count = structural_counts.get(category_name, 0)
             electrical_count = electrical_counts.get(category_name, 0)
-            total_count = structural_count + electrical_count
-
-            # Check if category is in any model
-            in_model = total_count > 0
-
-            # Check if category is in required categories
-            in_contract = category_name in required_categories
 
             # Build element count display with breakdown
-            if params.step_1.autodesk_file and params.step_1.autodesk_file_electrical:
+            if structural_file and electrical_file:
                 count_display = (
                     f"{total_count} (S:{structural_count}, E:{electrical_count})"
                 )
-            elif params.step_1.autodesk_file:
+            elif structural_file:
                 count_display = f"{structural_count}"
             else:
                 count_display = f"{electrical_count}"
 
-            # Determine status symbol, description, and color
-            if in_contract and in_model:
-                status_symbol = "✓"
-                status_text = "Present in contract and model(s)"
-                color = RGBColor(0, 128, 0)  # Green
-            elif in_contract and not in_model:
-                status_symbol = "✗"
-                status_text = "In contract but not in model(s)"
-                color = RGBColor(255, 165, 0)  # Orange
-            elif not in_contract and in_model:
-                status_symbol = "✗"
-                status_text = "Missing in the contract"
-                color = RGBColor(255, 0, 0)  # Red
-            else:  # not in_contract and not in_model
-                status_symbol = "✗"
-                status_text = "Not in contract, not in model(s)"
-                color = RGBColor(128, 128, 128)  # Gray
-
-            # Add row to table
-            row_cells = table.add_row().cells
-            row_cells[0].text = category_name
-            row_cells[1].text = status_symbol
-            row_cells[2].text = count_display
-            row_cells[3].text = status_text
-
-            # Apply color to status symbol
-            for paragraph in row_cells[1].paragraphs:
-                for run in paragraph.runs:
-                    run.font.color.rgb = color
-                    run.font.bold = True
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-            # Center align the element count
-            for paragraph in row_cells[2].paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-        vkt.progress_message("Finalizing document...", percentage=90)
-
-        # Save document to BytesIO
-        doc_io = io.BytesIO()
-        doc.save(doc_io)
-        doc_io.seek(0)
+            rows.append((category_name, count_display, bucket))
+
+        # Read the clock once for both the report and the filename
+        now = datetime.now()
+        report = _render_compliance_report_docx(
+            f"Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}",
+            file_lines,
+            rows,
+        )
+
+        _report_progress("Finalizing document...", percentage=90)
 
         # Create filename with timestamp
-        filename = f"Contract_Compliance_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
+        filename = f"Contract_Compliance_Report_{now.strftime('%Y%m%d_%H%M%S')}.docx"
 
         # Return as DownloadResult
-        return vkt.DownloadResult(vkt.File.from_data(doc_io.getvalue()), filename)
+        return vkt.DownloadResult(vkt.File.from_data(report), filename)
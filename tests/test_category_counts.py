@@ -0,0 +1,183 @@
+import unittest
+from unittest import mock
+
+import app
+
+
+def _validation_error():
+    return app.GraphQLError(
+        [
+            {
+                "message": "Unknown field",
+                "extensions": {"code": "GRAPHQL_VALIDATION_FAILED"},
+            }
+        ]
+    )
+
+
+def _counts_response(counts):
+    return {
+        f"c{index}": (
+            {"results": [{"values": [{"count": counts[name]}]}]}
+            if counts.get(name)
+            else {"results": []}
+        )
+        for index, name in enumerate(app.ALL_CATEGORIES)
+    }
+
+
+def _values_response(counts):
+    return {
+        "distinctPropertyValuesInElementGroupByName": {
+            "results": [
+                {"values": [{"value": name, "count": c} for name, c in counts.items()]}
+            ]
+        }
+    }
+
+
+class BuildCategoryCountsQueryTest(unittest.TestCase):
+    def test_one_alias_and_filter_variable_per_category(self):
+        query = app._build_category_counts_query(3)
+
+        self.assertTrue(
+            query.startswith(
+                "query CategoryCounts($elementGroupId: ID!, $c0Filter: String!, "
+                "$c1Filter: String!, $c2Filter: String!)"
+            )
+        )
+        for alias in ("c0", "c1", "c2"):
+            self.assertIn(
+                f"{alias}: distinctPropertyValuesInElementGroupByName(", query
+            )
+            self.assertIn(f"filter: {{ query: ${alias}Filter }}", query)
+        self.assertNotIn("c3", query)
+        self.assertIs(query, app._build_category_counts_query(3))
+
+
+class FetchModelCategoryCountsTest(unittest.TestCase):
+    def setUp(self):
+        # Start every test from empty process caches
+        for name, cache in (
+            ("_VERSIONED_CACHE", app._TTLCache(maxsize=64, ttl=60)),
+            ("_REJECTED_QUERIES", app._TTLCache(maxsize=32, ttl=60)),
+        ):
+            patcher = mock.patch.object(app, name, cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(app, "execute_graphql")
+        self.execute_graphql = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, group_id="group", token="token", extra_categories=()):
+        return app._fetch_model_category_counts(
+            token, "US", group_id, f"urn:{group_id}", extra_categories
+        )
+
+    def operations(self):
+        return [
+            call.args[0].split("(")[0].split()[-1]
+            for call in self.execute_graphql.call_args_list
+        ]
+
+    def test_counts_from_aliased_query(self):
+        self.execute_graphql.return_value = _counts_response({"Walls": 3, "Doors": 1})
+
+        self.assertEqual(self.fetch(), {"Walls": 3, "Doors": 1})
+        self.assertEqual(self.operations(), ["CategoryCounts"])
+
+    def test_extra_categories_get_their_own_alias(self):
+        extra_index = len(app.ALL_CATEGORIES)
+        response = _counts_response({"Walls": 3})
+        response[f"c{extra_index}"] = {"results": [{"values": [{"count": 2}]}]}
+        self.execute_graphql.return_value = response
+
+        self.assertEqual(
+            self.fetch(extra_categories=("Owner's Equipment",)),
+            {"Walls": 3, "Owner's Equipment": 2},
+        )
+        variables = self.execute_graphql.call_args.args[3]
+        self.assertEqual(
+            variables[f"c{extra_index}Filter"],
+            app._category_instance_filter("Owner's Equipment"),
+        )
+
+    def test_validation_error_falls_back_to_scoped_values_query(self):
+        self.execute_graphql.side_effect = [
+            _validation_error(),
+            _values_response({"Walls": 3}),
+        ]
+
+        self.assertEqual(self.fetch(), {"Walls": 3})
+        self.assertEqual(self.operations(), ["CategoryCounts", "UsedCategories"])
+        scoped_variables = self.execute_graphql.call_args.args[3]
+        self.assertEqual(
+            scoped_variables["filter"],
+            app._categories_instance_filter(app.ALL_CATEGORIES),
+        )
+
+    def test_scoped_validation_error_falls_back_to_broad_values_query(self):
+        self.execute_graphql.side_effect = [
+            _validation_error(),
+            _validation_error(),
+            _values_response({"Walls": 3}),
+        ]
+
+        self.assertEqual(self.fetch(), {"Walls": 3})
+        self.assertEqual(
+            self.operations(), ["CategoryCounts", "UsedCategories", "UsedCategories"]
+        )
+        broad_variables = self.execute_graphql.call_args.args[3]
+        self.assertEqual(broad_variables["filter"], app.RSQL_INSTANCE_FILTER)
+
+    def test_rejection_is_remembered_per_file_and_user(self):
+        self.execute_graphql.side_effect = [
+            _validation_error(),
+            _values_response({"Walls": 3}),
+        ]
+        self.fetch()
+
+        # Another version of the same file skips the rejected aliased query
+        self.execute_graphql.reset_mock()
+        self.execute_graphql.side_effect = [_values_response({"Walls": 4})]
+        app._fetch_model_category_counts("token", "US", "group", "urn:next")
+        self.assertEqual(self.operations(), ["UsedCategories"])
+
+        # Other files and users still try the aliased query first
+        for group_id, token in (("other", "token"), ("group", "other-token")):
+            self.execute_graphql.reset_mock()
+            self.execute_graphql.side_effect = [_counts_response({"Walls": 5})]
+            self.assertEqual(self.fetch(group_id, token), {"Walls": 5})
+            self.assertEqual(self.operations(), ["CategoryCounts"])
+
+    def test_other_graphql_errors_are_raised_without_fallback(self):
+        self.execute_graphql.side_effect = app.GraphQLError(
+            [
+                {
+                    "message": "Element group not found",
+                    "extensions": {"code": "NOT_FOUND"},
+                }
+            ]
+        )
+
+        with self.assertRaises(app.GraphQLError):
+            self.fetch()
+        self.assertEqual(self.operations(), ["CategoryCounts"])
+
+        # Nothing is remembered, a valid file uses the aliased query
+        self.execute_graphql.reset_mock()
+        self.execute_graphql.side_effect = [_counts_response({"Walls": 3})]
+        self.assertEqual(self.fetch("other"), {"Walls": 3})
+        self.assertEqual(self.operations(), ["CategoryCounts"])
+
+    def test_http_errors_are_raised_without_fallback(self):
+        self.execute_graphql.side_effect = RuntimeError("HTTP 401: Unauthorized")
+
+        with self.assertRaises(RuntimeError):
+            self.fetch()
+        self.assertEqual(self.operations(), ["CategoryCounts"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+
+import app
+
+
+def _page(*external_ids, cursor=None):
+    return {
+        "pagination": {"cursor": cursor, "pageSize": len(external_ids)},
+        "results": [
+            {"alternativeIdentifiers": {"externalElementId": external_id}}
+            for external_id in external_ids
+        ],
+    }
+
+
+class IterCategoriesExternalIdsTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(app, "execute_graphql")
+        self.execute_graphql = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(app.vkt.UserMessage, "warning")
+        self.warning = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def collect(self, category_names):
+        return list(
+            app._iter_categories_external_ids(category_names, "group", "token", "US")
+        )
+
+    def test_pages_every_category_in_one_document(self):
+        self.execute_graphql.side_effect = [
+            {"c0": _page("w1", cursor="next"), "c1": _page("d1")},
+            {"c0": _page("w2")},
+        ]
+
+        self.assertEqual(
+            self.collect(["Walls", "Doors"]),
+            [("Walls", "w1"), ("Doors", "d1"), ("Walls", "w2")],
+        )
+        second_variables = self.execute_graphql.call_args.args[3]
+        self.assertEqual(
+            second_variables["c0Pagination"], {"cursor": "next", "limit": 500}
+        )
+        self.assertNotIn("c1Filter", second_variables)
+
+    def test_failing_category_is_dropped_and_reported(self):
+        self.execute_graphql.side_effect = [
+            app.GraphQLError(
+                [{"message": "Invalid filter", "path": ["c1"]}],
+                {"c0": _page("w1"), "c1": None},
+            )
+        ]
+
+        self.assertEqual(self.collect(["Walls", "Bad Category"]), [("Walls", "w1")])
+        self.warning.assert_called_once()
+        self.assertIn("'Bad Category'", self.warning.call_args.args[0])
+        self.assertIn("Invalid filter", self.warning.call_args.args[0])
+
+    def test_error_without_partial_data_is_raised(self):
+        self.execute_graphql.side_effect = [
+            app.GraphQLError([{"message": "Unauthorized"}])
+        ]
+
+        with self.assertRaises(app.GraphQLError):
+            self.collect(["Walls", "Doors"])
+        self.warning.assert_not_called()
+
+    def test_rejected_limit_retries_the_page_with_a_smaller_limit(self):
+        self.execute_graphql.side_effect = [
+            app.GraphQLError([{"message": "limit must be at most 200"}]),
+            {"c0": _page("w1")},
+        ]
+
+        self.assertEqual(self.collect(["Walls"]), [("Walls", "w1")])
+        variables = self.execute_graphql.call_args.args[3]
+        self.assertEqual(variables["c0Pagination"], {"limit": 200})
+
+    def test_http_errors_are_not_retried(self):
+        self.execute_graphql.side_effect = [
+            RuntimeError("HTTP 429: Rate limit exceeded")
+        ]
+
+        with self.assertRaises(RuntimeError):
+            self.collect(["Walls"])
+        self.assertEqual(self.execute_graphql.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()